@@ -16,12 +16,18 @@ class Settings(BaseModel):
     min_market_cap_usd: float = float(os.getenv("MIN_MARKET_CAP_USD", "15000"))
     max_top10_holder_percent: float = float(os.getenv("MAX_TOP10_HOLDER_PERCENT", "20"))
 
+    log_level: str = os.getenv("LOG_LEVEL", "INFO").upper()
+    debug: bool = os.getenv("DEBUG", "").lower() in ("1", "true", "yes")
+
     # Comma-separated identifiers
     raydium_programs: str = os.getenv(
         "RAYDIUM_PROGRAMS",
         "raydium_amm:675kPX9MHTjS2zt1qfr1nyH7r7YG1JYHFeq9gS4j1h4,raydium_clmm:CAMMCzo5v5wzjMNk1E1vDLz8Y1gcF5sBf7bYkq7V88Y",
     )
 
+    # Comma-separated, case-insensitive log keywords that mark a pool creation
+    pool_log_keywords: str = os.getenv("POOL_LOG_KEYWORDS", "initialize,create_pool,init_pool")
+
     # Pyth price accounts for SOL/USD on mainnet
     pyth_sol_usd_price_account: str = os.getenv(
         "PYTH_SOL_USD", "J83w4HKfqxwcq3BEMMkPFSppX3gqekLyLJBexebFVkix"
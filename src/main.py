@@ -1,8 +1,18 @@
 import os
 import asyncio
+import atexit
 import logging
+import logging.handlers
+import queue
+import sqlite3
+import threading
+import time
 from math import floor
+from typing import Dict, List, Optional, Set, Tuple
 from flask import Flask, jsonify
+import uvicorn
+import uvloop
+from asgiref.wsgi import WsgiToAsgi
 from solana.rpc.async_api import AsyncClient
 
 from .config import settings
@@ -12,34 +22,75 @@ from .metrics import (
     get_top_holders_percent,
     derive_base_mint_from_tx,
     fetch_price_usd_for_mint,
+    fetch_prices_usd,
+    close_http_client,
 )
-from .storage import init_db, upsert_token, update_last_multiple
-from .telegram import send_message
+from .storage import (
+    DB_PATH,
+    init_db,
+    close_db,
+    upsert_tokens_many,
+    token_exists,
+    fetch_sweep_candidates,
+    update_last_multiples_batch,
+)
+from .telegram import send_message, run_sender, close_client as close_telegram_client
 
 # ---------- Logging setup ----------
-logging.basicConfig(level=logging.INFO)
+# Handlers run on a QueueListener thread so log I/O never blocks the event loop
+_log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+_log_stream = logging.StreamHandler()
+_log_stream.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_stream)
+_log_handler = logging.handlers.QueueHandler(_log_queue)
+# QueueHandler.prepare() already renders the record; the listener's stream
+# handler applies BASIC_FORMAT, so the prefix must not be added here too
+_log_handler.setFormatter(logging.Formatter("%(message)s"))
+logging.basicConfig(level=settings.log_level, handlers=[_log_handler])
+_log_listener.start()
+
+def _stop_log_listener() -> None:
+    # Drain queued records and log synchronously from here on. atexit alone is
+    # not enough: uvicorn re-raises SIGTERM with the default handler, which
+    # exits without running atexit hooks.
+    root = logging.getLogger()
+    if _log_handler not in root.handlers:
+        return
+    root.removeHandler(_log_handler)
+    root.addHandler(_log_stream)
+    _log_listener.stop()
+
+atexit.register(_stop_log_listener)
 logger = logging.getLogger(__name__)
 
 # ---------- Flask app ----------
 app = Flask(__name__)
 
+# ASGI wrapper so Flask is served on the same event loop as the watcher
+asgi = WsgiToAsgi(app)
+
 @app.route("/")
 def health():
     return "Solana Token Watcher is running!"
 
-@app.route("/debug_tokens")
-def debug_tokens():
-    import aiosqlite
-    import nest_asyncio
-    nest_asyncio.apply()  # Flask ilə asyncio-nu qarışdırmaq üçün
+DEBUG_TOKENS_SQL = "SELECT mint, initial_mc_usd, last_multiple FROM tokens"
+
+# Read-only connection shared by Flask handlers; opened on first use since
+# data.db may not exist yet when the module is imported.
+_ro_db: Optional[sqlite3.Connection] = None
+_ro_db_lock = threading.Lock()
 
-    async def get_tokens():
-        async with aiosqlite.connect("data.db") as db:
-            async with db.execute("SELECT mint, initial_mc_usd, last_multiple FROM tokens") as cur:
-                return await cur.fetchall()
+def _read_only_db() -> sqlite3.Connection:
+    global _ro_db
+    if _ro_db is None:
+        _ro_db = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True, check_same_thread=False)
+        _ro_db.execute("PRAGMA query_only=1")
+    return _ro_db
 
-    loop = asyncio.get_event_loop()
-    rows = loop.run_until_complete(get_tokens())
+@app.route("/debug_tokens")
+def debug_tokens():
+    with _ro_db_lock:
+        rows = _read_only_db().execute(DEBUG_TOKENS_SQL).fetchall()
     return jsonify({"count": len(rows), "rows": rows})
 
 @app.route("/trigger_test")
@@ -51,76 +102,168 @@ def trigger_test():
         return f"Failed to send test message: {str(e)}", 500
 
 # ---------- Token processing ----------
-FILTER_MSG_TEMPLATE = (
-    "CA: {mint}\n"
-    "├ 📊 MC: ${mc:.2f}K\n"
-    "├ 💬 Replies: 0\n"
-    "├ 👤 DEV:\n"
-    "│        Tokens: 1 | KoTH: 0 | Complete: 0\n"
-    "├ 🌐 Socials: X ({x}) | WEB ({web})\n"
-    "├ 🔊 Volume: ?\n"
-    "├ 📈 ATH: ?\n"
-    "├ 🧶 Bonding Curve: ?\n"
-    "├ 🔫 Snipers: ?\n"
-    "├ 👥 Holders: ?\n"
-    "├ 👤 Dev hold: 0%\n"
-    "└ 🏆 Top 10 Holders: Σ {top10:.2f}%\n"
-    "DEX PAID"
-)
+def _format_msg(mint: str, mc_k: float, top10: float, x: str, web: str) -> str:
+    return (
+        f"CA: {mint}\n"
+        f"├ 📊 MC: ${mc_k:.2f}K\n"
+        "├ 💬 Replies: 0\n"
+        "├ 👤 DEV:\n"
+        "│        Tokens: 1 | KoTH: 0 | Complete: 0\n"
+        f"├ 🌐 Socials: X ({x}) | WEB ({web})\n"
+        "├ 🔊 Volume: ?\n"
+        "├ 📈 ATH: ?\n"
+        "├ 🧶 Bonding Curve: ?\n"
+        "├ 🔫 Snipers: ?\n"
+        "├ 👥 Holders: ?\n"
+        "├ 👤 Dev hold: 0%\n"
+        f"└ 🏆 Top 10 Holders: Σ {top10:.2f}%\n"
+        "DEX PAID"
+    )
+
+SEEN_TTL_SECONDS = 600
+
+# Mints currently going through the pipeline, and mints recently finished
+# (mint -> expiry on the monotonic clock), so bursts of pool events for the
+# same token only run the price/MC/holders checks once.
+_inflight: Set[str] = set()
+_seen: Dict[str, float] = {}
+
+def _mark_seen(mint: str) -> None:
+    now = time.monotonic()
+    if len(_seen) > 1000:
+        for m in [m for m, expiry in _seen.items() if expiry <= now]:
+            del _seen[m]
+    _seen[mint] = now + SEEN_TTL_SECONDS
 
 async def process_new_token(client: AsyncClient, signature: str) -> None:
-    logger.info(f"Processing new pool signature: {signature}")
+    logger.info("Processing new pool signature: %s", signature)
     mint = await derive_base_mint_from_tx(client, signature)
     if not mint:
         logger.info("No mint derived from transaction.")
         return
 
+    if mint in _inflight or _seen.get(mint, 0.0) > time.monotonic():
+        logger.info("Mint %s already processed recently. Skipping.", mint)
+        return
+    _inflight.add(mint)
+    try:
+        if await token_exists(mint):
+            logger.info("Mint %s already stored. Skipping.", mint)
+            return
+        await _evaluate_new_token(client, mint)
+    finally:
+        _inflight.discard(mint)
+        _mark_seen(mint)
+
+async def _evaluate_new_token(client: AsyncClient, mint: str) -> None:
     price = await fetch_price_usd_for_mint(mint) or 0.0
     if price <= 0:
-        logger.info(f"Price not found for mint {mint}. Skipping.")
+        logger.info("Price not found for mint %s. Skipping.", mint)
         return
 
     mc = await compute_market_cap_usd(client, mint, price)
     top10 = await get_top_holders_percent(client, mint)
 
     if mc < settings.min_market_cap_usd:
-        logger.info(f"Market cap ${mc} below threshold for {mint}. Skipping.")
+        logger.info("Market cap $%s below threshold for %s. Skipping.", mc, mint)
         return
     if top10 > settings.max_top10_holder_percent:
-        logger.info(f"Top10 holders {top10}% above limit for {mint}. Skipping.")
+        logger.info("Top10 holders %s%% above limit for %s. Skipping.", top10, mint)
         return
 
-    await upsert_token(mint, symbol="?", name="?", initial_mc_usd=mc)
-    logger.info(f"Token {mint} saved to DB with MC ${mc}")
+    _pending_upserts.put_nowait((mint, "?", "?", mc))
+    logger.info("Token %s queued for DB with MC $%s", mint, mc)
 
-    text = FILTER_MSG_TEMPLATE.format(
-        mint=mint, mc=mc / 1000.0, top10=top10, x="n/a", web="n/a"
-    )
+    text = _format_msg(mint, mc / 1000.0, top10, x="n/a", web="n/a")
     send_message(text)
-    logger.info(f"Telegram message sent for token {mint}")
+    logger.info("Telegram message queued for token %s", mint)
+
+UPSERT_BATCH_SIZE = 64
+UPSERT_FLUSH_SECONDS = 0.05
+
+# (mint, symbol, name, initial_mc_usd) rows waiting to be written together
+_pending_upserts: "asyncio.Queue[Tuple[str, str, str, float]]" = asyncio.Queue()
+
+async def upsert_flusher() -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await _pending_upserts.get()]
+        try:
+            deadline = loop.time() + UPSERT_FLUSH_SECONDS
+            while len(batch) < UPSERT_BATCH_SIZE:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(_pending_upserts.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+        finally:
+            # Also runs on cancellation so a half-collected batch is not lost.
+            # Fire-and-forget: write failures are logged by the storage writer
+            await upsert_tokens_many(batch)
+
+async def _flush_pending_upserts() -> None:
+    leftover = []
+    while not _pending_upserts.empty():
+        leftover.append(_pending_upserts.get_nowait())
+    if leftover:
+        await upsert_tokens_many(leftover)
+
+MULTIPLIER_CONCURRENCY = 20
+MULTIPLIER_INTERVAL_SECONDS = 45
+
+async def _check_multiplier(
+    client: AsyncClient,
+    sem: asyncio.Semaphore,
+    mint: str,
+    initial_mc_usd: float,
+    last_multiple: int,
+    price: float,
+) -> Optional[Tuple[int, str]]:
+    if price <= 0 or initial_mc_usd <= 0:
+        return None
+    async with sem:
+        mc = await compute_market_cap_usd(client, mint, price)
+    multiple_float = mc / initial_mc_usd
+    target = max(last_multiple + 1, 2)
+    hit = floor(multiple_float)
+    if hit >= target:
+        send_message(f"{mint} reached {hit}x (${mc/1000:.2f}K MC)")
+        logger.info("Multiplier hit %sx for %s", hit, mint)
+        return hit, mint
+    return None
 
 async def monitor_multipliers(client: AsyncClient) -> None:
-    import aiosqlite
+    sem = asyncio.Semaphore(MULTIPLIER_CONCURRENCY)
     while True:
         try:
-            async with aiosqlite.connect("data.db") as db:
-                async with db.execute("SELECT mint, initial_mc_usd, last_multiple FROM tokens") as cur:
-                    rows = await cur.fetchall()
-                    for mint, initial_mc_usd, last_multiple in rows:
-                        price = await fetch_price_usd_for_mint(mint) or 0.0
-                        if price <= 0 or initial_mc_usd <= 0:
-                            continue
-                        mc = await compute_market_cap_usd(client, mint, price)
-                        multiple_float = mc / initial_mc_usd
-                        target = max(last_multiple + 1, 2)
-                        hit = floor(multiple_float)
-                        if hit >= target:
-                            send_message(f"{mint} reached {hit}x (${mc/1000:.2f}K MC)")
-                            await update_last_multiple(mint, hit)
-                            logger.info(f"Multiplier hit {hit}x for {mint}")
+            started = time.time()
+            rows = await fetch_sweep_candidates(started - MULTIPLIER_INTERVAL_SECONDS)
+            prices = await fetch_prices_usd([mint for mint, _, _ in rows])
+            results = await asyncio.gather(
+                *[
+                    _check_multiplier(client, sem, mint, initial_mc_usd, last_multiple, prices.get(mint, 0.0))
+                    for mint, initial_mc_usd, last_multiple in rows
+                ],
+                return_exceptions=True,
+            )
+            updates: List[Tuple[int, str]] = []
+            for (mint, _, _), result in zip(rows, results):
+                if isinstance(result, Exception):
+                    logger.error("Error checking multiplier for %s: %s", mint, result)
+                elif result is not None:
+                    updates.append(result)
+            if rows:
+                await update_last_multiples_batch(
+                    updates, checked_mints=[mint for mint, _, _ in rows], checked_at=started
+                )
         except Exception as e:
-            logger.error(f"Error in monitor_multipliers: {e}")
-        await asyncio.sleep(45)
+            logger.error("Error in monitor_multipliers: %s", e)
+        await asyncio.sleep(MULTIPLIER_INTERVAL_SECONDS)
+
+POOL_QUEUE_SIZE = 500
+POOL_WORKERS = 8
 
 async def main_async() -> None:
     await init_db()
@@ -129,21 +272,83 @@ async def main_async() -> None:
     # Telegram startup message
     try:
         send_message("Solana Token Watcher started ✅")
-        logger.info("Startup message sent to Telegram")
+        logger.info("Startup message queued for Telegram")
     except Exception as e:
-        logger.error(f"Failed to send startup message: {e}")
+        logger.error("Failed to send startup message: %s", e)
+
+    signatures: asyncio.Queue[str] = asyncio.Queue(maxsize=POOL_QUEUE_SIZE)
 
     async def pool_listener():
         async for pool in watch_new_pools():
             signature = pool.get("signature") or ""
-            if signature:
+            if not signature:
+                continue
+            if signatures.full():
+                # Drop the oldest signature rather than stall the websocket
+                signatures.get_nowait()
+                signatures.task_done()
+                logger.warning("Pool queue full, dropping oldest signature")
+            signatures.put_nowait(signature)
+
+    async def worker():
+        while True:
+            signature = await signatures.get()
+            try:
                 await process_new_token(client, signature)
+            except Exception as e:
+                logger.error("Error processing %s: %s", signature, e)
+            finally:
+                signatures.task_done()
 
-    await asyncio.gather(pool_listener(), monitor_multipliers(client))
+    try:
+        await asyncio.gather(
+            pool_listener(),
+            *[worker() for _ in range(POOL_WORKERS)],
+            upsert_flusher(),
+            run_sender(),
+            monitor_multipliers(client),
+        )
+    finally:
+        await _flush_pending_upserts()
+        await close_http_client()
+        await close_telegram_client()
+        await close_db()
 
-# ---------- Run Flask + background async watcher ----------
-if __name__ == "__main__":
+# ---------- Run Flask + async watcher on one event loop ----------
+class _Server(uvicorn.Server):
+    # uvicorn re-raises a captured SIGTERM/SIGINT with the default handler once
+    # serve() unwinds, so the watcher has to be stopped from inside shutdown()
+    # for main_async()'s cleanup to run at all.
+    watcher: Optional["asyncio.Task[None]"] = None
+
+    async def shutdown(self, sockets=None) -> None:
+        await super().shutdown(sockets=sockets)
+        await _stop_watcher(self.watcher)
+        _stop_log_listener()
+
+async def _stop_watcher(watcher: Optional["asyncio.Task[None]"]) -> None:
+    if watcher is None or watcher.done():
+        return
+    watcher.cancel()
+    try:
+        await watcher
+    except asyncio.CancelledError:
+        pass
+
+async def serve() -> None:
     port = int(os.environ.get("PORT", 10000))
-    loop = asyncio.get_event_loop()
-    loop.create_task(main_async())
-    app.run(host="0.0.0.0", port=port)
+    server = _Server(uvicorn.Config(asgi, host="0.0.0.0", port=port))
+    server.watcher = asyncio.create_task(main_async())
+    # A crashed watcher takes the server down with it
+    server.watcher.add_done_callback(lambda _: setattr(server, "should_exit", True))
+    try:
+        await server.serve()
+    finally:
+        await _stop_watcher(server.watcher)
+        _stop_log_listener()
+    if not server.watcher.cancelled():
+        server.watcher.result()
+
+if __name__ == "__main__":
+    uvloop.install()
+    asyncio.run(serve())
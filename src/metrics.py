@@ -1,19 +1,68 @@
+import asyncio
+import functools
+import time
+import urllib.parse as up
+from collections import OrderedDict
 from typing import Dict, List, Tuple, Optional
 from solana.rpc.async_api import AsyncClient
 from solders.pubkey import Pubkey
 from .config import settings
-import aiohttp
+import httpx
+
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60),
+            timeout=10.0,
+        )
+    return _client
+
+
+async def close_http_client() -> None:
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+
+
+@functools.lru_cache(maxsize=4096)
+def _pk(mint: str) -> Pubkey:
+    return Pubkey.from_string(mint)
+
+
+SUPPLY_CACHE_SIZE = 4096
+
+# LRU of mint -> (amount, decimals); bounded like _pk so rejected new-pool
+# candidates age out instead of living for the whole process
+_supply_cache: "OrderedDict[str, Tuple[int, int]]" = OrderedDict()
 
 
 async def get_token_supply(client: AsyncClient, mint: str) -> Tuple[int, int]:
-    resp = await client.get_token_supply(Pubkey.from_string(mint))
+    cached = _supply_cache.get(mint)
+    if cached is not None:
+        _supply_cache.move_to_end(mint)
+        return cached
+    resp = await client.get_token_supply(_pk(mint))
     amount = int(resp.value.amount)
     decimals = resp.value.decimals
+    _supply_cache[mint] = (amount, decimals)
+    if len(_supply_cache) > SUPPLY_CACHE_SIZE:
+        _supply_cache.popitem(last=False)
     return amount, decimals
 
 
+def invalidate_supply(mint: str) -> None:
+    _supply_cache.pop(mint, None)
+
+
 async def get_top_holders_percent(client: AsyncClient, mint: str, top_n: int = 10) -> float:
-    resp = await client.get_token_largest_accounts(Pubkey.from_string(mint))
+    resp = await client.get_token_largest_accounts(_pk(mint))
     amounts: List[int] = [int(a.amount) for a in resp.value]
     total_amount = sum(amounts)
     if total_amount == 0:
@@ -26,17 +75,8 @@ async def get_quote_price_usd(client: AsyncClient, quote: str) -> float:
     if quote.upper() == "USDC":
         return 1.0
     if quote.upper() == "SOL":
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get("https://price.jup.ag/v4/price?ids=SOL") as r:
-                    if r.status == 200:
-                        data = await r.json()
-                        price = data.get("data", {}).get("SOL", {}).get("price")
-                        if price:
-                            return float(price)
-        except Exception:
-            pass
-        return 1.0
+        prices = await fetch_prices_usd(["SOL"])
+        return prices.get("SOL", 1.0)
     return 1.0
 
 
@@ -49,6 +89,12 @@ async def derive_base_mint_from_tx(client: AsyncClient, signature: str) -> Optio
         return None
     post_balances = meta.post_token_balances or []
     pre_balances = meta.pre_token_balances or []
+    if len(post_balances) * len(pre_balances) < 64:
+        # Small transactions: a nested scan is cheaper than building a set
+        for b in post_balances:
+            if not any(pb.mint == b.mint for pb in pre_balances):
+                return str(b.mint)
+        return None
     pre_mints = {b.mint for b in pre_balances}
     for b in post_balances:
         if b.mint not in pre_mints:
@@ -56,21 +102,108 @@ async def derive_base_mint_from_tx(client: AsyncClient, signature: str) -> Optio
     return None
 
 
+# Bursts of new pools hit this from every ingest worker at once; cache misses
+# wait PRICE_DEBOUNCE_SECONDS and are priced together by one fetch_prices_usd.
 async def fetch_price_usd_for_mint(mint: str) -> Optional[float]:
+    global _price_flush
+    cached = _price_cache.get(mint)
+    if cached is not None and time.monotonic() < cached[1]:
+        return cached[0]
+    loop = asyncio.get_running_loop()
+    fut = loop.create_future()
+    _pending_prices.setdefault(mint, []).append(fut)
+    if _price_flush is None:
+        _price_flush = loop.create_task(_flush_pending_prices())
+        _price_flush.add_done_callback(_on_price_flush_done)
+    return await fut
+
+
+def _take_pending_prices() -> Dict[str, List["asyncio.Future[Optional[float]]"]]:
+    global _price_flush
+    pending = dict(_pending_prices)
+    _pending_prices.clear()
+    _price_flush = None
+    return pending
+
+
+def _resolve_prices(
+    pending: Dict[str, List["asyncio.Future[Optional[float]]"]], prices: Dict[str, float]
+) -> None:
+    for mint, futs in pending.items():
+        for fut in futs:
+            if not fut.done():
+                fut.set_result(prices.get(mint))
+
+
+def _on_price_flush_done(task: "asyncio.Task[None]") -> None:
+    # Cancelled before it took its batch: don't leave the waiters hanging.
+    if task is _price_flush:
+        _resolve_prices(_take_pending_prices(), {})
+
+
+async def _flush_pending_prices() -> None:
+    await asyncio.sleep(PRICE_DEBOUNCE_SECONDS)
+    pending = _take_pending_prices()
+    prices: Dict[str, float] = {}
     try:
-        import urllib.parse as up
-        qs = up.urlencode({"ids": mint})
-        url = f"https://price.jup.ag/v4/price?{qs}"
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, timeout=10) as r:
-                if r.status == 200:
-                    data = await r.json()
-                    price = data.get("data", {}).get(mint, {}).get("price")
-                    if price:
-                        return float(price)
+        prices = await fetch_prices_usd(list(pending))
     except Exception:
-        return None
-    return None
+        pass
+    finally:
+        _resolve_prices(pending, prices)
+
+
+PRICE_BATCH_SIZE = 100
+PRICE_TTL_SECONDS = 20.0
+PRICE_DEBOUNCE_SECONDS = 0.05
+
+# mint -> (price, expiry on the monotonic clock)
+_price_cache: Dict[str, Tuple[float, float]] = {}
+# mint -> callers waiting on the next coalesced price batch
+_pending_prices: Dict[str, List["asyncio.Future[Optional[float]]"]] = {}
+_price_flush: Optional["asyncio.Task[None]"] = None
+
+
+async def fetch_prices_usd(mints: List[str]) -> Dict[str, float]:
+    prices: Dict[str, float] = {}
+    misses: List[str] = []
+    now = time.monotonic()
+    for mint in dict.fromkeys(mints):
+        cached = _price_cache.get(mint)
+        if cached is not None and now < cached[1]:
+            prices[mint] = cached[0]
+        else:
+            misses.append(mint)
+    for i in range(0, len(misses), PRICE_BATCH_SIZE):
+        chunk = misses[i:i + PRICE_BATCH_SIZE]
+        try:
+            qs = up.urlencode({"ids": ",".join(chunk)})
+            url = f"https://price.jup.ag/v4/price?{qs}"
+            r = await _get_client().get(url)
+            if r.status_code != 200:
+                continue
+            data = r.json().get("data")
+        except Exception:
+            continue
+        if not isinstance(data, dict):
+            continue
+        now = time.monotonic()
+        if len(_price_cache) > 1000:
+            for m in [m for m, (_, exp) in _price_cache.items() if exp <= now]:
+                del _price_cache[m]
+        expiry = now + PRICE_TTL_SECONDS
+        for mint in chunk:
+            entry = data.get(mint)
+            if not isinstance(entry, dict):
+                continue
+            try:
+                price = float(entry.get("price") or 0.0)
+            except (TypeError, ValueError):
+                continue
+            if price:
+                prices[mint] = price
+                _price_cache[mint] = (price, expiry)
+    return prices
 
 
 async def compute_market_cap_usd(client: AsyncClient, mint: str, price_usd: float) -> float:
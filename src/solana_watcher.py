@@ -1,59 +1,132 @@
 import asyncio
 import json
+from collections import OrderedDict
+import logging
+import random
+import re
+import simdjson
 import websockets
+from websockets.exceptions import WebSocketException
 from typing import AsyncIterator, Dict, Any
 from .config import settings
 
 
+logger = logging.getLogger(__name__)
+
+RECONNECT_MAX_SECONDS = 30
+SEEN_SIGNATURES_MAX = 10000
+
+
 RAYDIUM_PROGRAM_IDS = [
     pid.split(":")[1] for pid in settings.raydium_programs.split(",") if ":" in pid
 ]
+_ID_BYTES = tuple(pid.encode() for pid in RAYDIUM_PROGRAM_IDS)
+
+# Serialized once; sent as a str so it goes out as a text frame
+_SUBSCRIBE_FRAME = json.dumps(
+    {
+        "jsonrpc": "2.0",
+        "id": 1,
+        "method": "logsSubscribe",
+        "params": [
+            {"mentions": RAYDIUM_PROGRAM_IDS},
+            {"commitment": "finalized", "filter": {"mentions": RAYDIUM_PROGRAM_IDS}},
+        ],
+    }
+)
+
+_NOTIFICATION_MARKER = '"logsNotification"'
+_NOTIFICATION_MARKER_BYTES = _NOTIFICATION_MARKER.encode()
+
+DEFAULT_POOL_LOG_KEYWORDS = ["initialize", "create_pool", "init_pool"]
+# An empty list would compile to a regex that matches every frame
+POOL_LOG_KEYWORDS = [
+    kw.strip() for kw in settings.pool_log_keywords.split(",") if kw.strip()
+] or DEFAULT_POOL_LOG_KEYWORDS
+POOL_LOG_PATTERN = "|".join(re.escape(kw) for kw in POOL_LOG_KEYWORDS)
+_POOL_LOG_RE = re.compile(POOL_LOG_PATTERN, re.IGNORECASE)
+_POOL_LOG_RE_BYTES = re.compile(POOL_LOG_PATTERN.encode(), re.IGNORECASE)
+
+
+async def _logs_stream() -> AsyncIterator[str | bytes]:
+    attempt = 0
+    while True:
+        try:
+            async with websockets.connect(settings.resolved_ws(), ping_interval=20, ping_timeout=20) as ws:
+                await ws.send(_SUBSCRIBE_FRAME)
+                while True:
+                    msg = await ws.recv()
+                    # Only a connection that actually delivers frames counts as healthy
+                    attempt = 0
+                    if isinstance(msg, bytes):
+                        marker, ids, matcher = _NOTIFICATION_MARKER_BYTES, _ID_BYTES, _POOL_LOG_RE_BYTES
+                    else:
+                        marker, ids, matcher = _NOTIFICATION_MARKER, RAYDIUM_PROGRAM_IDS, _POOL_LOG_RE
+                    # Subscription acks and other non-notification frames
+                    if marker not in msg:
+                        continue
+                    if not any(pid in msg for pid in ids):
+                        continue
+                    # Frames without a pool-creation keyword anywhere never reach the parser
+                    if not matcher.search(msg):
+                        continue
+                    yield msg
+        except (WebSocketException, OSError, asyncio.TimeoutError) as e:
+            # Cap the exponent too: 2 ** 1024 no longer converts to float
+            delay = min(RECONNECT_MAX_SECONDS, 0.5 * 2 ** min(attempt, 6)) + random.random()
+            attempt += 1
+            logger.warning("Websocket dropped (%s), reconnecting in %.1fs", e, delay)
+            await asyncio.sleep(delay)
+
+
+# Reused across frames. Documents it returns must not outlive the call that
+# parsed them, so only plain str values ever leave _extract_pool_creation.
+_parser = simdjson.Parser()
 
 
-async def _logs_stream() -> AsyncIterator[Dict[str, Any]]:
-    async with websockets.connect(settings.resolved_ws(), ping_interval=20, ping_timeout=20) as ws:
-        sub_id = 1
-        await ws.send(
-            json.dumps(
-                {
-                    "jsonrpc": "2.0",
-                    "id": sub_id,
-                    "method": "logsSubscribe",
-                    "params": [
-                        {"mentions": RAYDIUM_PROGRAM_IDS},
-                        {"commitment": "finalized", "filter": {"mentions": RAYDIUM_PROGRAM_IDS}},
-                    ],
-                }
-            )
-        )
-        while True:
-            msg = await ws.recv()
-            try:
-                data = json.loads(msg)
-            except Exception:
-                continue
-            if "method" in data and data.get("method") == "logsNotification":
-                yield data
-
-
-def _extract_pool_creation(event: Dict[str, Any]) -> Dict[str, Any] | None:
-    params = event.get("params", {})
-    result = params.get("result", {})
-    value = result.get("value", {})
-    logs = value.get("logs", [])
-    signature = value.get("signature")
-    for line in logs:
-        if isinstance(line, str) and ("initialize" in line.lower() or "create_pool" in line.lower() or "init_pool" in line.lower()):
-            return {
-                "dex_paid": True,
-                "signature": signature,
-                "raw": event,
-            }
-    return None
+def _extract_pool_creation(msg: str | bytes) -> Dict[str, Any] | None:
+    try:
+        doc = _parser.parse(msg)
+        if doc.at_pointer("/method") != "logsNotification":
+            return None
+        logs = doc.at_pointer("/params/result/value/logs")
+        signature = doc.at_pointer("/params/result/value/signature")
+    except (ValueError, KeyError, TypeError):
+        return None
+    try:
+        # One C-level join and regex pass instead of a Python loop per line
+        blob = "\n".join(logs)
+    except TypeError:
+        # Non-string log entry: malformed frame
+        return None
+    match = _POOL_LOG_RE.search(blob)
+    if match is None:
+        return None
+    # Keywords never span a newline, so the match sits inside a single line
+    start = blob.rfind("\n", 0, match.start()) + 1
+    end = blob.find("\n", match.end())
+    found = {
+        "dex_paid": True,
+        "signature": signature,
+        "log": blob[start:end if end != -1 else len(blob)],
+    }
+    if settings.debug:
+        found["raw"] = msg
+    return found
 
 
 async def watch_new_pools() -> AsyncIterator[Dict[str, Any]]:
-    async for ev in _logs_stream():
-        found = _extract_pool_creation(ev)
-        if found:
-            yield found
+    # Bounded LRU of recent signatures; resubscribes after a reconnect can
+    # replay notifications that were already yielded.
+    seen: OrderedDict[str, None] = OrderedDict()
+    async for msg in _logs_stream():
+        found = _extract_pool_creation(msg)
+        if not found:
+            continue
+        signature = found["signature"]
+        if signature in seen:
+            continue
+        seen[signature] = None
+        if len(seen) > SEEN_SIGNATURES_MAX:
+            seen.popitem(last=False)
+        yield found
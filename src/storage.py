@@ -1,45 +1,225 @@
-import aiosqlite
-from typing import Optional, Tuple
+import asyncio
+import logging
+import queue
+import sqlite3
+import threading
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
 
 
 DB_PATH = "data.db"
 
 
+PRAGMA_SQL = """
+PRAGMA journal_mode=WAL;
+PRAGMA synchronous=NORMAL;
+PRAGMA busy_timeout=5000;
+PRAGMA temp_store=MEMORY;
+PRAGMA mmap_size=268435456;
+"""
+
+
 CREATE_SQL = """
 CREATE TABLE IF NOT EXISTS tokens (
     mint TEXT PRIMARY KEY,
     symbol TEXT,
     name TEXT,
     initial_mc_usd REAL,
-    last_multiple INTEGER DEFAULT 1
+    last_multiple INTEGER DEFAULT 1,
+    last_checked REAL
 );
 """
 
 
+INDEX_SQL = """
+CREATE INDEX IF NOT EXISTS idx_tokens_active ON tokens(last_checked) WHERE initial_mc_usd > 0;
+"""
+
+
+# All database work runs on one thread that owns the only read/write
+# connection. Jobs are (fn, future, loop); fire-and-forget writes have no
+# future, reads get their result back through the submitting loop.
+_Job = Tuple[Callable[[sqlite3.Connection], Any], Optional[asyncio.Future], Optional[asyncio.AbstractEventLoop]]
+
+_jobs: "queue.SimpleQueue[Optional[_Job]]" = queue.SimpleQueue()
+_writer: Optional[threading.Thread] = None
+_writer_lock = threading.Lock()
+
+
+def _resolve(fut: asyncio.Future, result: Any, error: Optional[BaseException]) -> None:
+    if fut.cancelled():
+        return
+    if error is not None:
+        fut.set_exception(error)
+    else:
+        fut.set_result(result)
+
+
+def _fail_pending(error: BaseException) -> None:
+    # Called with _writer_lock held, so no job can be queued behind the drain
+    global _writer
+    _writer = None
+    while True:
+        try:
+            job = _jobs.get_nowait()
+        except queue.Empty:
+            return
+        if job is None:
+            continue
+        _, fut, loop = job
+        if fut is not None and loop is not None:
+            try:
+                loop.call_soon_threadsafe(_resolve, fut, None, error)
+            except RuntimeError:
+                # Submitting loop already closed
+                pass
+
+
+def _run_writer() -> None:
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        conn.executescript(PRAGMA_SQL)
+    except Exception as e:
+        logger.error("Failed to open database %s: %s", DB_PATH, e)
+        with _writer_lock:
+            _fail_pending(e)
+        return
+    try:
+        while True:
+            job = _jobs.get()
+            if job is None:
+                break
+            fn, fut, loop = job
+            result, error = None, None
+            try:
+                result = fn(conn)
+            except Exception as e:
+                conn.rollback()
+                error = e
+            if fut is not None and loop is not None:
+                loop.call_soon_threadsafe(_resolve, fut, result, error)
+            elif error is not None:
+                logger.error("Database write failed: %s", error)
+    finally:
+        conn.close()
+
+
+def _enqueue(job: _Job) -> None:
+    global _writer
+    # Starting the writer and queueing happen under one lock so a writer that
+    # fails to open the database fails this job too instead of stranding it
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = threading.Thread(target=_run_writer, name="sqlite-writer", daemon=True)
+            _writer.start()
+        _jobs.put(job)
+
+
+async def _call(fn: Callable[[sqlite3.Connection], Any]) -> Any:
+    loop = asyncio.get_running_loop()
+    fut = loop.create_future()
+    _enqueue((fn, fut, loop))
+    return await fut
+
+
+def _submit(fn: Callable[[sqlite3.Connection], Any]) -> None:
+    _enqueue((fn, None, None))
+
+
+async def close_db() -> None:
+    global _writer
+    writer = _writer
+    if writer is None:
+        return
+    # Queued writes ahead of the sentinel are flushed before the thread exits
+    _jobs.put(None)
+    await asyncio.to_thread(writer.join)
+    _writer = None
+
+
+def _init_db(conn: sqlite3.Connection) -> None:
+    conn.execute(CREATE_SQL)
+    # Databases created before last_checked existed need the column added
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(tokens)")}
+    if "last_checked" not in columns:
+        conn.execute("ALTER TABLE tokens ADD COLUMN last_checked REAL")
+    conn.execute(INDEX_SQL)
+    conn.commit()
+
+
 async def init_db() -> None:
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(CREATE_SQL)
-        await db.commit()
+    await _call(_init_db)
+
+
+# No RETURNING clause: callers never read the upserted row back
+_UPSERT_SQL = (
+    "INSERT INTO tokens (mint, symbol, name, initial_mc_usd, last_multiple) VALUES (?, ?, ?, ?, 1)\n"
+    "ON CONFLICT(mint) DO UPDATE SET symbol=excluded.symbol, name=excluded.name"
+)
+_GET_TOKEN_SQL = "SELECT mint, symbol, name, initial_mc_usd, last_multiple FROM tokens WHERE mint=?"
+_TOKEN_EXISTS_SQL = "SELECT 1 FROM tokens WHERE mint=?"
+_UPDATE_MULT_SQL = "UPDATE tokens SET last_multiple=? WHERE mint=?"
+_UPDATE_CHECKED_SQL = "UPDATE tokens SET last_checked=? WHERE mint=?"
+_SWEEP_SQL = (
+    "SELECT mint, initial_mc_usd, last_multiple FROM tokens\n"
+    "WHERE initial_mc_usd > 0 AND (last_checked IS NULL OR last_checked < ?)\n"
+    "ORDER BY last_checked"
+)
 
 
 async def upsert_token(mint: str, symbol: str, name: str, initial_mc_usd: float) -> None:
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            "INSERT INTO tokens (mint, symbol, name, initial_mc_usd, last_multiple) VALUES (?, ?, ?, ?, 1)\n"
-            "ON CONFLICT(mint) DO UPDATE SET symbol=excluded.symbol, name=excluded.name",
-            (mint, symbol, name, initial_mc_usd),
-        )
-        await db.commit()
+    def write(conn: sqlite3.Connection) -> None:
+        conn.execute(_UPSERT_SQL, (mint, symbol, name, initial_mc_usd))
+        conn.commit()
+
+    _submit(write)
+
+
+async def upsert_tokens_many(records: Iterable[Tuple[str, str, str, float]]) -> None:
+    rows = list(records)
+
+    def write(conn: sqlite3.Connection) -> None:
+        conn.executemany(_UPSERT_SQL, rows)
+        conn.commit()
+
+    _submit(write)
 
 
 async def get_token(mint: str) -> Optional[Tuple[str, str, str, float, int]]:
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute("SELECT mint, symbol, name, initial_mc_usd, last_multiple FROM tokens WHERE mint=?", (mint,)) as cur:
-            row = await cur.fetchone()
-            return row if row else None
+    return await _call(lambda conn: conn.execute(_GET_TOKEN_SQL, (mint,)).fetchone())
+
+
+async def token_exists(mint: str) -> bool:
+    return await _call(lambda conn: conn.execute(_TOKEN_EXISTS_SQL, (mint,)).fetchone() is not None)
 
 
 async def update_last_multiple(mint: str, multiple: int) -> None:
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("UPDATE tokens SET last_multiple=? WHERE mint=?", (multiple, mint))
-        await db.commit()
+    def write(conn: sqlite3.Connection) -> None:
+        conn.execute(_UPDATE_MULT_SQL, (multiple, mint))
+        conn.commit()
+
+    _submit(write)
+
+
+async def fetch_sweep_candidates(checked_before: float) -> List[Tuple[str, float, int]]:
+    return await _call(lambda conn: conn.execute(_SWEEP_SQL, (checked_before,)).fetchall())
+
+
+async def update_last_multiples_batch(
+    pairs: Iterable[Tuple[int, str]],
+    checked_mints: Iterable[str] = (),
+    checked_at: Optional[float] = None,
+) -> None:
+    pairs = list(pairs)
+    checked = [(checked_at, mint) for mint in checked_mints] if checked_at is not None else []
+
+    def write(conn: sqlite3.Connection) -> None:
+        # sqlite3 opens one implicit transaction for the statements below, so
+        # the sweep costs a single commit regardless of how many rows it touches.
+        conn.executemany(_UPDATE_MULT_SQL, pairs)
+        conn.executemany(_UPDATE_CHECKED_SQL, checked)
+        conn.commit()
+
+    _submit(write)
@@ -1,17 +1,76 @@
-import requests
+import asyncio
+from typing import Optional
+
+import httpx
 from .config import settings
 
 
-def send_message(text: str) -> None:
-    if not settings.telegram_bot_token or not settings.telegram_chat_id:
-        return
+SEND_QUEUE_SIZE = 1000
+
+# Characters legacy Markdown parse_mode treats as entity markers. None of our
+# alerts use formatting, so they are always sent literally.
+_MD_ESCAPE = str.maketrans({c: "\\" + c for c in "_*`["})
+
+_client: Optional[httpx.AsyncClient] = None
+_queue: "asyncio.Queue[str]" = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+# Loop running run_sender(); used to enqueue from non-async threads
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            timeout=10.0,
+        )
+    return _client
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+
+
+async def _post(text: str) -> None:
     url = f"https://api.telegram.org/bot{settings.telegram_bot_token}/sendMessage"
     payload = {
         "chat_id": settings.telegram_chat_id,
-        "text": text,
+        "text": text.translate(_MD_ESCAPE),
         "parse_mode": "Markdown"
     }
     try:
-        requests.post(url, json=payload, timeout=10)
+        await _get_client().post(url, json=payload)
     except Exception:
         pass
+
+
+async def run_sender() -> None:
+    global _loop
+    _loop = asyncio.get_running_loop()
+    while True:
+        text = await _queue.get()
+        await _post(text)
+
+
+def _enqueue(text: str) -> None:
+    try:
+        _queue.put_nowait(text)
+    except asyncio.QueueFull:
+        pass
+
+
+def send_message(text: str) -> None:
+    if not settings.telegram_bot_token or not settings.telegram_chat_id:
+        return
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        # Called from a worker thread (e.g. a Flask handler)
+        if _loop is not None:
+            _loop.call_soon_threadsafe(_enqueue, text)
+        return
+    _enqueue(text)